@@ -4,14 +4,100 @@ Web-based Meld port - Proof of concept
 Generates HTML/CSS/JS for a 3-column diff viewer with SVG/WebGL linkmap
 """
 
-import difflib
+from collections import Counter
+import functools
+import hashlib
 import json
 import os
+import time
 from pathlib import Path
-from typing import List, NamedTuple
+from typing import Iterator, List, NamedTuple, Optional, Tuple, Union
 import html
 
 from jinja2 import Environment, FileSystemLoader
+from jinja2.environment import TemplateStream
+
+# CyDifflib is a C++ drop-in for difflib with identical opcodes, much faster
+try:
+    from cydifflib import SequenceMatcher
+    _CYDIFFLIB = True
+except ImportError:
+    from difflib import SequenceMatcher
+    _CYDIFFLIB = False
+
+# orjson serializes the chunk list for the page several times faster than json
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# diff-match-patch (Myers' O(ND) diff) can beat plain difflib on long lines, and on
+# large files, with few edits
+try:
+    from diff_match_patch import diff_match_patch
+    _DMP = diff_match_patch()
+    _DMP_LINES = diff_match_patch()
+except ImportError:
+    _DMP = None
+    _DMP_LINES = None
+
+
+# Computed diffs are cached on disk, keyed on the contents of both files and the
+# diff backend. Bump the version whenever compute_diff() output changes so stale
+# entries are not reused. Temporary files left by interrupted writes are removed
+# once they are older than DIFF_CACHE_TMP_MAX_AGE seconds
+DIFF_CACHE_VERSION = 5
+DIFF_CACHE_MAX_ENTRIES = 64
+DIFF_CACHE_TMP_MAX_AGE = 3600
+
+# CSS class for each chunk tag
+_CHUNK_CLASS = {
+    'replace': 'chunk-replace',
+    'delete': 'chunk-delete',
+    'insert': 'chunk-insert',
+}
+
+# Combined length of a line pair above which inline highlighting is skipped
+INLINE_HIGHLIGHT_LIMIT = 20 * 1024
+
+# Without CyDifflib, character diffs of line pairs at least this long (combined) try
+# diff-match-patch first. Being pure Python it only wins on long lines with few edits
+# (2000 char lines, 2% edited: 3.9ms vs 24.9ms for difflib; 4000 chars: 7.8ms vs 82ms)
+# and loses badly on shorter or unrelated lines (200 chars, unrelated: 15ms vs 0.7ms),
+# so it is given up for SequenceMatcher after INLINE_MYERS_TIMEOUT seconds
+INLINE_MYERS_MIN_LENGTH = 4000
+INLINE_MYERS_TIMEOUT = 0.05
+
+# Pairs diffed with diff-match-patch are highlighted up to this combined length instead,
+# since it runs in linear space. Pairs too long for SequenceMatcher are left without
+# highlighting if it times out. All character diffs in a page may spend at most
+# INLINE_MYERS_BUDGET seconds in diff-match-patch, after which it is no longer tried
+INLINE_MYERS_HIGHLIGHT_LIMIT = 1024 * 1024
+INLINE_MYERS_BUDGET = 2.0
+_inline_myers_budget = INLINE_MYERS_BUDGET
+
+# Longest line pair (combined) kept in the inline diff cache, so its 4096 entries
+# stay bounded (about 80MB of ASCII text) even when much longer lines are highlighted
+INLINE_CACHE_MAX_LENGTH = 20 * 1024
+
+# Above this many line pairs (len(lines_a) * len(lines_b)), line diffs may use Myers'
+# algorithm from diff-match-patch instead of plain difflib. diff-match-patch is pure
+# Python and its cost grows with the square of the edit distance, so it is only tried
+# when a cheap lower bound on the number of edited lines is at most MYERS_MAX_EDITS,
+# and abandoned for SequenceMatcher if it runs past MYERS_LINE_TIMEOUT seconds
+MYERS_LINE_THRESHOLD = 1_000_000
+MYERS_MAX_EDITS = 1000
+MYERS_LINE_TIMEOUT = 1.0
+
+# Below this combined length, stripping common prefix/suffix costs more than it saves
+AFFIX_TRIM_THRESHOLD = 64
+
+# SequenceMatcher's autojunk ignores items making up over 1% of an input of 200+ items.
+# For lines that means blank lines and lone braces, which gives a coarser diff, so it
+# is off for character diffs and smaller files. In larger files those popular lines
+# make the matcher much slower without it (8000 lines, 30% blank or "}": 0.02s with
+# autojunk, 0.86s without), so it is left on from this many lines (both files combined)
+AUTOJUNK_LINE_THRESHOLD = 4000
 
 
 class DiffChunk(NamedTuple):
@@ -22,42 +108,266 @@ class DiffChunk(NamedTuple):
     end_b: int
 
 
-def compute_diff(text_a: str, text_b: str) -> List[DiffChunk]:
-    """Compute diff chunks between two texts using Python's difflib"""
-    lines_a = text_a.splitlines()
-    lines_b = text_b.splitlines()
+def _common_affix(a, b) -> Tuple[int, int]:
+    """Return the lengths of the common prefix and common suffix of two sequences"""
+    n = min(len(a), len(b))
+    prefix = 0
+    while prefix < n and a[prefix] == b[prefix]:
+        prefix += 1
+    suffix = 0
+    while suffix < n - prefix and a[-1 - suffix] == b[-1 - suffix]:
+        suffix += 1
+    return prefix, suffix
 
-    matcher = difflib.SequenceMatcher(None, lines_a, lines_b)
-    chunks = []
 
+def _trimmed_opcodes(a, b, autojunk: bool = False) -> List[tuple]:
+    """Get SequenceMatcher opcodes, running the matcher only on the part between
+    the common prefix and suffix (most edits leave long identical head/tail runs)"""
+    if len(a) + len(b) < AFFIX_TRIM_THRESHOLD:
+        return SequenceMatcher(None, a, b, autojunk=autojunk).get_opcodes()
+
+    prefix, suffix = _common_affix(a, b)
+    matcher = SequenceMatcher(None, a[prefix:len(a) - suffix], b[prefix:len(b) - suffix], autojunk=autojunk)
+
+    opcodes = []
+    if prefix:
+        opcodes.append(('equal', 0, prefix, 0, prefix))
     for tag, i1, i2, j1, j2 in matcher.get_opcodes():
+        opcodes.append((tag, i1 + prefix, i2 + prefix, j1 + prefix, j2 + prefix))
+    if suffix:
+        opcodes.append(('equal', len(a) - suffix, len(a), len(b) - suffix, len(b)))
+    return opcodes
+
+
+def _dmp_opcodes(diffs: List[Tuple[int, str]]) -> List[tuple]:
+    """Convert diff-match-patch (op, text) diffs to SequenceMatcher-style opcodes,
+    merging an adjacent deletion and insertion into a replace"""
+    opcodes = []
+    i = j = 0
+    for op, text in diffs:
+        n = len(text)
+        if op == 0:
+            opcodes.append(('equal', i, i + n, j, j + n))
+            i += n
+            j += n
+        elif op < 0:
+            if opcodes and opcodes[-1][0] == 'insert':
+                _, i1, _, j1, j2 = opcodes.pop()
+                opcodes.append(('replace', i1, i + n, j1, j2))
+            else:
+                opcodes.append(('delete', i, i + n, j, j))
+            i += n
+        else:
+            if opcodes and opcodes[-1][0] == 'delete':
+                _, i1, i2, j1, _ = opcodes.pop()
+                opcodes.append(('replace', i1, i2, j1, j + n))
+            else:
+                opcodes.append(('insert', i, i, j, j + n))
+            j += n
+    return opcodes
+
+
+def _myers_line_opcodes(lines_a: List[str], lines_b: List[str]) -> Optional[List[tuple]]:
+    """Get line-level opcodes from diff-match-patch, by encoding each distinct line as
+    one character. Returns None if the diff is likely too expensive, if it hit the
+    timeout, or if there are too many distinct lines to encode."""
+    # Lines without a counterpart on the other side must each be an edit
+    counts_a = Counter(lines_a)
+    counts_b = Counter(lines_b)
+    min_edits = sum((counts_a - counts_b).values()) + sum((counts_b - counts_a).values())
+    if min_edits > MYERS_MAX_EDITS:
+        return None
+
+    codes = {}
+    try:
+        chars_a = ''.join([chr(codes.setdefault(line, len(codes))) for line in lines_a])
+        chars_b = ''.join([chr(codes.setdefault(line, len(codes))) for line in lines_b])
+    except ValueError:
+        return None
+
+    # On timeout diff-match-patch reports everything left as one big change
+    _DMP_LINES.Diff_Timeout = MYERS_LINE_TIMEOUT
+    start = time.time()
+    diffs = _DMP_LINES.diff_main(chars_a, chars_b, False)
+    if time.time() - start >= MYERS_LINE_TIMEOUT:
+        return None
+
+    return _dmp_opcodes(diffs)
+
+
+def _as_lines(text: Union[str, List[str]]) -> List[str]:
+    """Split text into lines, passing through text that is already split"""
+    return text.splitlines() if isinstance(text, str) else text
+
+
+def compute_diff(text_a: Union[str, List[str]], text_b: Union[str, List[str]]) -> List[DiffChunk]:
+    """Compute diff chunks between two texts using difflib (or CyDifflib), or
+    diff-match-patch for large inputs with few edits
+
+    Either text may be given already split into lines, to avoid splitting it again.
+    """
+    lines_a = _as_lines(text_a)
+    lines_b = _as_lines(text_b)
+
+    opcodes = None
+    if (_DMP_LINES is not None and not _CYDIFFLIB
+            and len(lines_a) * len(lines_b) > MYERS_LINE_THRESHOLD):
+        opcodes = _myers_line_opcodes(lines_a, lines_b)
+    if opcodes is None:
+        autojunk = len(lines_a) + len(lines_b) >= AUTOJUNK_LINE_THRESHOLD
+        opcodes = _trimmed_opcodes(lines_a, lines_b, autojunk)
+
+    chunks = []
+
+    for tag, i1, i2, j1, j2 in opcodes:
         if tag != 'equal':  # Only include changes, not equal blocks
             chunks.append(DiffChunk(tag, i1, i2, j1, j2))
 
     return chunks
 
 
-def compute_inline_diff(text1: str, text2: str) -> List[tuple]:
-    """Compute character-level diff for inline highlighting"""
-    matcher = difflib.SequenceMatcher(None, text1, text2)
-    return matcher.get_opcodes()
+def _inline_uses_myers(length: int) -> bool:
+    """Whether a line pair of this combined length is diffed with diff-match-patch first"""
+    return (_DMP is not None and not _CYDIFFLIB and length >= INLINE_MYERS_MIN_LENGTH
+            and _inline_myers_budget > 0)
+
+
+def _inline_opcodes(text1: str, text2: str) -> Optional[Tuple[tuple, ...]]:
+    """Character-level opcodes from SequenceMatcher, or from diff-match-patch for long
+    lines when it is installed without CyDifflib. Returns None if diff-match-patch timed
+    out on a pair longer than INLINE_HIGHLIGHT_LIMIT."""
+    global _inline_myers_budget
+
+    if text1 == text2:
+        return (('equal', 0, len(text1), 0, len(text2)),) if text1 else ()
+
+    length = len(text1) + len(text2)
+    if _inline_uses_myers(length):
+        # On timeout diff-match-patch reports everything left as one big change
+        _DMP.Diff_Timeout = INLINE_MYERS_TIMEOUT
+        start = time.time()
+        diffs = _DMP.diff_main(text1, text2, False)
+        elapsed = time.time() - start
+        _inline_myers_budget -= elapsed
+        if elapsed < INLINE_MYERS_TIMEOUT:
+            _DMP.diff_cleanupSemantic(diffs)
+            return tuple(_dmp_opcodes(diffs))
+        if length > INLINE_HIGHLIGHT_LIMIT:
+            return None
+
+    return tuple(_trimmed_opcodes(text1, text2))
+
+
+_cached_inline_opcodes = functools.lru_cache(maxsize=4096)(_inline_opcodes)
+
+
+def compute_inline_diff(text1: str, text2: str) -> Optional[Tuple[tuple, ...]]:
+    """Compute character-level diff for inline highlighting, or None if a long pair
+    could not be diffed in time
+
+    Results are cached, since real diffs often repeat the same line pairs. Pairs
+    longer than INLINE_CACHE_MAX_LENGTH are not, to keep the cache's memory bounded.
+    """
+    if len(text1) + len(text2) > INLINE_CACHE_MAX_LENGTH:
+        return _inline_opcodes(text1, text2)
+    return _cached_inline_opcodes(text1, text2)
+
+
+def _diff_cache_dir() -> Optional[Path]:
+    """Default diff cache directory, or None if there is no home directory for it"""
+    base = os.environ.get('XDG_CACHE_HOME')
+    if base:
+        base = Path(base)
+    else:
+        try:
+            base = Path.home() / '.cache'
+        except RuntimeError:
+            return None
+    # Before Python 3.12 Path.home() gives an unexpanded '~' rather than raising
+    if not base.is_absolute():
+        return None
+    return base / 'meld-port'
+
+
+def _line_diff_backend() -> str:
+    """Name of the implementation compute_diff() will use, which can change its output"""
+    matcher = 'cydifflib' if _CYDIFFLIB else 'difflib'
+    return matcher + ('+dmp' if _DMP_LINES is not None else '')
+
+
+def _diff_cache_path(text_a: str, text_b: str, cache_dir: Path) -> Path:
+    """Path of the cache entry for a pair of texts"""
+    key = hashlib.sha256(f"v{DIFF_CACHE_VERSION}:{_line_diff_backend()}".encode())
+    for text in (text_a, text_b):
+        key.update(hashlib.sha256(text.encode('utf-8', 'surrogatepass')).digest())
+    return cache_dir / (key.hexdigest() + '.json')
+
+
+def load_cached_diff(text_a: str, text_b: str, cache_dir: Optional[Path] = None) -> Optional[List[DiffChunk]]:
+    """Return the cached diff chunks for two texts, or None if not cached"""
+    cache_dir = cache_dir or _diff_cache_dir()
+    if cache_dir is None:
+        return None
+
+    path = _diff_cache_path(text_a, text_b, cache_dir)
+    try:
+        with open(path, 'rb') as f:
+            chunks = [DiffChunk(*chunk) for chunk in json.load(f)]
+        for chunk in chunks:
+            if chunk.tag not in _CHUNK_CLASS or not all(type(n) is int and n >= 0 for n in chunk[1:]):
+                raise ValueError(f"invalid chunk in {path}")
+        # Mark as recently used for eviction
+        os.utime(path)
+    except (OSError, TypeError, ValueError):
+        return None
+
+    return chunks
+
+
+def store_cached_diff(text_a: str, text_b: str, chunks: List[DiffChunk],
+                      cache_dir: Optional[Path] = None) -> None:
+    """Cache the diff chunks for two texts, evicting the least recently used entries"""
+    cache_dir = cache_dir or _diff_cache_dir()
+    if cache_dir is None:
+        return
+
+    path = _diff_cache_path(text_a, text_b, cache_dir)
+    try:
+        cache_dir.mkdir(parents=True, exist_ok=True)
+        tmp_path = path.with_suffix(f'.{os.getpid()}.tmp')
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(chunks, f)
+        os.replace(tmp_path, path)
+
+        entries = sorted(cache_dir.glob('*.json'), key=lambda entry: entry.stat().st_mtime)
+        for entry in entries[:-DIFF_CACHE_MAX_ENTRIES]:
+            entry.unlink()
+
+        # Leftovers from interrupted writes; recent ones may still be in progress
+        for entry in cache_dir.glob('*.tmp'):
+            if time.time() - entry.stat().st_mtime > DIFF_CACHE_TMP_MAX_AGE:
+                entry.unlink()
+    except OSError as e:
+        print(f"Warning: could not write diff cache: {e}")
 
 
 def format_line_with_inline_diff(line: str, other_line: str, is_changed: bool) -> str:
     """Format a line with inline character-level highlighting"""
-    INLINE_HIGHLIGHT_LIMIT = 20 * 1024  # 20KB combined length limit
-
     if not is_changed or not line or not other_line:
         # No inline diff needed
         return html.escape(line) if line else "&nbsp;"
 
     # Bail on long sequences - character-level diff is expensive
-    if len(line) + len(other_line) > INLINE_HIGHLIGHT_LIMIT:
+    length = len(line) + len(other_line)
+    limit = INLINE_MYERS_HIGHLIGHT_LIMIT if _inline_uses_myers(length) else INLINE_HIGHLIGHT_LIMIT
+    if length > limit:
         # Skip inline highlighting for performance
         return html.escape(line) if line else "&nbsp;"
 
     # Compute character-level diff
     opcodes = compute_inline_diff(line, other_line)
+    if opcodes is None:
+        return html.escape(line)
 
     result = []
     for tag, i1, i2, j1, j2 in opcodes:
@@ -72,72 +382,77 @@ def format_line_with_inline_diff(line: str, other_line: str, is_changed: bool) -
     return ''.join(result) if result else "&nbsp;"
 
 
-def format_lines(lines: List[str], other_lines: List[str], chunks: List[DiffChunk], is_left: bool) -> str:
-    """Format lines with line numbers and chunk highlighting"""
-    html_lines = []
+def _line_map(n: int, chunks: List[DiffChunk], is_left: bool) -> Tuple[List[str], List[int]]:
+    """Precompute the chunk class of every line on one side, and for lines in
+    replace chunks the index of the corresponding line in the other file (-1 if none)"""
+    class_of = [""] * n
+    other_of = [-1] * n
+    for chunk in chunks:
+        if is_left:
+            start, end, start_other, end_other = chunk.start_a, chunk.end_a, chunk.start_b, chunk.end_b
+        else:
+            start, end, start_other, end_other = chunk.start_b, chunk.end_b, chunk.start_a, chunk.end_a
+
+        class_of[start:end] = [_CHUNK_CLASS[chunk.tag]] * (end - start)
+        if chunk.tag == 'replace':
+            paired = min(end - start, end_other - start_other)
+            other_of[start:start + paired] = range(start_other, start_other + paired)
+    return class_of, other_of
+
+
+def _escape_lines(lines: List[str]) -> List[str]:
+    """HTML-escape all lines with one html.escape() call over the joined text"""
+    escaped = html.escape('\n'.join(lines)).split('\n')
+    # Lines from splitlines() never contain '\n', but callers may pass lines that do
+    if len(escaped) != len(lines):
+        escaped = [html.escape(line) for line in lines]
+    return escaped
+
+
+def iter_formatted_lines(lines: List[str], other_lines: List[str], chunks: List[DiffChunk],
+                         is_left: bool) -> Iterator[str]:
+    """Yield the HTML for each line, with line numbers and chunk highlighting"""
+    class_of, other_of = _line_map(len(lines), chunks, is_left)
+    escaped_lines = _escape_lines(lines)
+
     for i, line in enumerate(lines):
-        # Find if this line is part of a chunk
-        chunk_class = ""
-        chunk_tag = None
-        for chunk in chunks:
-            if is_left:
-                if chunk.start_a <= i < chunk.end_a:
-                    chunk_class = f"chunk-{chunk.tag}"
-                    chunk_tag = chunk.tag
-                    break
-            else:
-                if chunk.start_b <= i < chunk.end_b:
-                    chunk_class = f"chunk-{chunk.tag}"
-                    chunk_tag = chunk.tag
-                    break
-
-        # For replace chunks, compute inline diff
-        if chunk_tag == 'replace':
-            # Find corresponding line in other file
-            for chunk in chunks:
-                if is_left:
-                    if chunk.start_a <= i < chunk.end_a and chunk.tag == 'replace':
-                        # Map to corresponding line in other file
-                        offset = i - chunk.start_a
-                        other_idx = chunk.start_b + offset
-                        if 0 <= other_idx < len(other_lines):
-                            formatted_line = format_line_with_inline_diff(
-                                line, other_lines[other_idx], True
-                            )
-                        else:
-                            formatted_line = html.escape(line) if line else "&nbsp;"
-                        break
-                else:
-                    if chunk.start_b <= i < chunk.end_b and chunk.tag == 'replace':
-                        # Map to corresponding line in other file
-                        offset = i - chunk.start_b
-                        other_idx = chunk.start_a + offset
-                        if 0 <= other_idx < len(other_lines):
-                            formatted_line = format_line_with_inline_diff(
-                                line, other_lines[other_idx], True
-                            )
-                        else:
-                            formatted_line = html.escape(line) if line else "&nbsp;"
-                        break
-            else:
-                formatted_line = html.escape(line) if line else "&nbsp;"
+        # For replace chunks, compute inline diff against the corresponding line
+        other_idx = other_of[i]
+        if other_idx != -1:
+            formatted_line = format_line_with_inline_diff(line, other_lines[other_idx], True)
         else:
-            formatted_line = html.escape(line) if line else "&nbsp;"
+            formatted_line = escaped_lines[i] or "&nbsp;"
 
-        html_lines.append(
-            f'<div class="line {chunk_class}" data-line="{i}">'
+        yield (
+            f'<div class="line {class_of[i]}" data-line="{i}">'
             f'<span class="line-num">{i + 1}</span>'
             f'<span class="line-content">{formatted_line}</span>'
             f'</div>'
         )
-    return '\n'.join(html_lines)
 
 
-def generate_html(text_a: str, text_b: str, chunks: List[DiffChunk], template_path: str) -> str:
-    """Generate complete HTML page with diff viewer using Jinja2 template"""
+def format_lines(lines: List[str], other_lines: List[str], chunks: List[DiffChunk], is_left: bool) -> str:
+    """Format lines with line numbers and chunk highlighting"""
+    return '\n'.join(iter_formatted_lines(lines, other_lines, chunks, is_left))
+
+
+def generate_html(text_a: Union[str, List[str]], text_b: Union[str, List[str]],
+                  chunks: List[DiffChunk], template_path: str) -> TemplateStream:
+    """Generate complete HTML page with diff viewer using Jinja2 template
 
-    lines_a = text_a.splitlines()
-    lines_b = text_b.splitlines()
+    Either text may be given already split into lines, to avoid splitting it again.
+    The page is returned as a stream, so it can be written out without first
+    being rendered into one large string.
+    """
+
+    global _inline_myers_budget
+
+    # Keep the inline diff cache and time budget to a single run
+    _cached_inline_opcodes.cache_clear()
+    _inline_myers_budget = INLINE_MYERS_BUDGET
+
+    lines_a = _as_lines(text_a)
+    lines_b = _as_lines(text_b)
 
     # Format content for both panes (with inline diff support)
     left_content = format_lines(lines_a, lines_b, chunks, True)
@@ -163,16 +478,19 @@ def generate_html(text_a: str, text_b: str, chunks: List[DiffChunk], template_pa
     env = Environment(loader=FileSystemLoader(template_dir))
     template = env.get_template(template_file)
 
-    # Render template
-    html_output = template.render(
+    if orjson is not None:
+        chunks_json = orjson.dumps(chunks_data).decode('utf-8')
+    else:
+        chunks_json = json.dumps(chunks_data)
+
+    # Render template lazily
+    return template.stream(
         left_content=left_content,
         right_content=right_content,
-        chunks_json=json.dumps(chunks_data),
+        chunks_json=chunks_json,
         chunk_count=len(chunks)
     )
 
-    return html_output
-
 
 def check_file_limits(text: str, filename: str) -> bool:
     """Check file for limiting conditions (long lines, binary content)"""
@@ -184,13 +502,28 @@ def check_file_limits(text: str, filename: str) -> bool:
         print("Binary files are not supported in the diff viewer.")
         return False
 
-    # Check for extremely long lines
-    lines = text.splitlines()
-    for i, line in enumerate(lines, 1):
-        if len(line) > LINE_LENGTH_LIMIT:
-            print(f"Error: {filename} line {i} exceeds {LINE_LENGTH_LIMIT} characters ({len(line)} chars)")
-            print("Files with very long lines can cause browser hangs and are not supported.")
-            return False
+    # Check for extremely long lines without splitting the whole text. Jump to the
+    # last newline within each LINE_LENGTH_LIMIT + 1 window: every line starting
+    # before it is short enough, so only a window with no newline needs a closer look
+    start = 0
+    while len(text) - start > LINE_LENGTH_LIMIT:
+        newline = text.rfind('\n', start, start + LINE_LENGTH_LIMIT + 1)
+        if newline != -1:
+            start = newline + 1
+            continue
+
+        end = text.find('\n', start)
+        if end == -1:
+            end = len(text)
+
+        # splitlines() also breaks on '\r' and the other line separators
+        for offset, line in enumerate(text[start:end].splitlines()):
+            if len(line) > LINE_LENGTH_LIMIT:
+                i = len(text[:start].splitlines()) + offset + 1
+                print(f"Error: {filename} line {i} exceeds {LINE_LENGTH_LIMIT} characters ({len(line)} chars)")
+                print("Files with very long lines can cause browser hangs and are not supported.")
+                return False
+        start = end + 1
 
     return True
 
@@ -214,8 +547,12 @@ def main():
     with open(file_b, 'r', encoding='utf-8') as f:
         text_b = f.read()
 
-    print(f"Loaded a.txt: {len(text_a)} bytes ({len(text_a.splitlines())} lines)")
-    print(f"Loaded b.txt: {len(text_b)} bytes ({len(text_b.splitlines())} lines)")
+    # Split once and share the lines between diffing and formatting
+    lines_a = text_a.splitlines()
+    lines_b = text_b.splitlines()
+
+    print(f"Loaded a.txt: {len(text_a)} bytes ({len(lines_a)} lines)")
+    print(f"Loaded b.txt: {len(text_b)} bytes ({len(lines_b)} lines)")
 
     # Check file limits
     if not check_file_limits(text_a, 'a.txt'):
@@ -223,9 +560,14 @@ def main():
     if not check_file_limits(text_b, 'b.txt'):
         return
 
-    # Compute diff
-    chunks = compute_diff(text_a, text_b)
-    print(f"\nComputing diff...")
+    # Compute diff, unless these exact files were diffed before
+    chunks = load_cached_diff(text_a, text_b)
+    if chunks is None:
+        print(f"\nComputing diff...")
+        chunks = compute_diff(lines_a, lines_b)
+        store_cached_diff(text_a, text_b, chunks)
+    else:
+        print(f"\nLoaded diff from cache")
     print(f"Found {len(chunks)} change chunks")
 
     # Generate HTML using template
@@ -235,15 +577,14 @@ def main():
         print(f"Error: template.html not found at {template_path}")
         return
 
-    html_output = generate_html(text_a, text_b, chunks, str(template_path))
+    html_stream = generate_html(lines_a, lines_b, chunks, str(template_path))
 
-    # Write to file
+    # Write to file as the template renders
     output_path = script_dir / 'test-output.html'
-    with open(output_path, 'w', encoding='utf-8') as f:
-        f.write(html_output)
+    html_stream.dump(str(output_path), encoding='utf-8')
 
     print(f"\nGenerated: {output_path}")
-    print(f"File size: {len(html_output) / 1024:.1f} KB")
+    print(f"File size: {output_path.stat().st_size / 1024:.1f} KB")
     print(f"\nOpen in browser: file://{output_path.absolute()}")
 
     # Print chunk summary
@@ -3,7 +3,13 @@
 Unit tests for meld_port.py
 """
 
+import json
+import os
+import tempfile
+import time
 import unittest
+from pathlib import Path
+from unittest import mock
 
 # Import meld_port module
 import meld_port
@@ -11,6 +17,7 @@ import meld_port
 compute_diff = meld_port.compute_diff
 compute_inline_diff = meld_port.compute_inline_diff
 format_line_with_inline_diff = meld_port.format_line_with_inline_diff
+format_lines = meld_port.format_lines
 check_file_limits = meld_port.check_file_limits
 
 
@@ -57,6 +64,86 @@ class TestComputeDiff(unittest.TestCase):
         chunks = compute_diff(text_a, text_b)
         self.assertGreater(len(chunks), 1, "Should detect multiple changes")
 
+    def test_popular_lines_not_junked(self):
+        """Test frequently repeated lines still anchor the diff"""
+        lines_a = ["a"] + ["}"] * 150 + ["x" + str(i) for i in range(100)]
+        lines_b = ["b"] + ["}"] * 150 + ["y" + str(i) for i in range(100)]
+        chunks = compute_diff(lines_a, lines_b)
+        self.assertEqual(chunks, [
+            meld_port.DiffChunk('replace', 0, 1, 0, 1),
+            meld_port.DiffChunk('replace', 151, 251, 151, 251),
+        ])
+
+    @unittest.skipIf(meld_port._DMP is None, "diff-match-patch not installed")
+    def test_myers_matches_sequence_matcher(self):
+        """Test large inputs diffed with Myers' algorithm give the expected chunks"""
+        lines_a = ["line " + str(i) for i in range(1200)]
+        lines_b = list(lines_a)
+        lines_b[10] = "changed"
+        del lines_b[500:503]
+        lines_b.insert(900, "inserted")
+        expected = [
+            meld_port.DiffChunk('replace', 10, 11, 10, 11),
+            meld_port.DiffChunk('delete', 500, 503, 500, 500),
+            meld_port.DiffChunk('insert', 903, 903, 900, 901),
+        ]
+        with mock.patch.object(meld_port, 'MYERS_LINE_THRESHOLD', 0), \
+                mock.patch.object(meld_port, '_CYDIFFLIB', False), \
+                mock.patch.object(meld_port._DMP_LINES, 'diff_main', wraps=meld_port._DMP_LINES.diff_main) as diff_main:
+            self.assertEqual(compute_diff(lines_a, lines_b), expected)
+        diff_main.assert_called()
+        with mock.patch.object(meld_port, '_DMP_LINES', None):
+            self.assertEqual(compute_diff(lines_a, lines_b), expected)
+
+    @unittest.skipIf(meld_port._DMP is None, "diff-match-patch not installed")
+    def test_heavily_edited_skips_myers(self):
+        """Test Myers' algorithm is not tried when many lines differ"""
+        lines_a = ["line " + str(i) for i in range(3000)]
+        lines_b = [line + " edited" if i % 3 == 0 else line for i, line in enumerate(lines_a)]
+        with mock.patch.object(meld_port, 'MYERS_LINE_THRESHOLD', 0), \
+                mock.patch.object(meld_port, '_CYDIFFLIB', False), \
+                mock.patch.object(meld_port._DMP_LINES, 'diff_main') as diff_main:
+            chunks = compute_diff(lines_a, lines_b)
+        diff_main.assert_not_called()
+        self.assertEqual(len(chunks), 1000)
+
+    @unittest.skipIf(meld_port._DMP is None, "diff-match-patch not installed")
+    def test_myers_timeout_falls_back(self):
+        """Test a Myers diff that runs out of time falls back to SequenceMatcher"""
+        lines_a = ["line " + str(i) for i in range(1200)]
+        lines_b = [line + " edited" if i % 100 == 0 else line for i, line in enumerate(lines_a)]
+        expected = compute_diff(lines_a, lines_b)
+        with mock.patch.object(meld_port, 'MYERS_LINE_THRESHOLD', 0), \
+                mock.patch.object(meld_port, '_CYDIFFLIB', False), \
+                mock.patch.object(meld_port, 'MYERS_LINE_TIMEOUT', 1e-9):
+            self.assertEqual(compute_diff(lines_a, lines_b), expected)
+
+    def test_large_inputs_use_autojunk(self):
+        """Test autojunk stays on for large line inputs, where it is needed for speed"""
+        lines_a = ["line " + str(i) for i in range(2500)]
+        lines_b = ["line " + str(i) for i in range(1, 2501)]
+        with mock.patch.object(meld_port, 'SequenceMatcher', wraps=meld_port.SequenceMatcher) as matcher, \
+                mock.patch.object(meld_port, '_DMP_LINES', None):
+            compute_diff(lines_a, lines_b)
+            self.assertTrue(matcher.call_args.kwargs['autojunk'])
+            compute_diff(lines_a[:100], lines_b[:100])
+            self.assertFalse(matcher.call_args.kwargs['autojunk'])
+
+    def test_pre_split_lines(self):
+        """Test diff of texts already split into lines"""
+        text_a = "A\nB\nC\nD"
+        text_b = "A\nX\nC\nY\nZ"
+        chunks = compute_diff(text_a.splitlines(), text_b.splitlines())
+        self.assertEqual(chunks, compute_diff(text_a, text_b))
+
+    def test_long_common_prefix_suffix(self):
+        """Test chunk offsets when a long shared head and tail are trimmed"""
+        common = ["line" + str(i) for i in range(100)]
+        text_a = "\n".join(common + ["old"] + common)
+        text_b = "\n".join(common + ["new", "extra"] + common)
+        chunks = compute_diff(text_a, text_b)
+        self.assertEqual(chunks, [meld_port.DiffChunk('replace', 100, 101, 100, 102)])
+
 
 class TestComputeInlineDiff(unittest.TestCase):
     def test_no_change(self):
@@ -83,6 +170,75 @@ class TestComputeInlineDiff(unittest.TestCase):
         found_delete = any(op[0] == 'delete' for op in opcodes)
         self.assertTrue(found_delete, "Should detect character deletion")
 
+    def test_long_strings(self):
+        """Test opcodes cover both strings when a common prefix/suffix is trimmed"""
+        text1 = "x" * 100 + "abc" + "y" * 100
+        text2 = "x" * 100 + "aXc" + "y" * 100
+        opcodes = compute_inline_diff(text1, text2)
+        self.assertEqual(opcodes[0], ('equal', 0, 101, 0, 101))
+        self.assertEqual(opcodes[1], ('replace', 101, 102, 101, 102))
+        self.assertEqual(opcodes[-1][2], len(text1))
+        self.assertEqual(opcodes[-1][4], len(text2))
+
+        identical = compute_inline_diff(text1, text1)
+        self.assertEqual(identical, (('equal', 0, len(text1), 0, len(text1)),))
+
+    def test_dmp_opcodes(self):
+        """Test diff-match-patch diffs convert to SequenceMatcher-style opcodes"""
+        diffs = [(0, "h"), (-1, "e"), (1, "a"), (0, "ll"), (1, "!"), (0, "o"), (-1, "?")]
+        self.assertEqual(meld_port._dmp_opcodes(diffs), [
+            ('equal', 0, 1, 0, 1),
+            ('replace', 1, 2, 1, 2),
+            ('equal', 2, 4, 2, 4),
+            ('insert', 4, 4, 4, 5),
+            ('equal', 4, 5, 5, 6),
+            ('delete', 5, 6, 6, 6),
+        ])
+
+    @unittest.skipIf(meld_port._DMP is None, "diff-match-patch not installed")
+    def test_myers_only_for_long_lines(self):
+        """Test diff-match-patch is only tried for long lines, and not with CyDifflib"""
+        text1 = "x" * meld_port.INLINE_MYERS_MIN_LENGTH
+        text2 = "x" * 100 + "y" + "x" * (meld_port.INLINE_MYERS_MIN_LENGTH - 101)
+        with mock.patch.object(meld_port, '_CYDIFFLIB', False), \
+                mock.patch.object(meld_port._DMP, 'diff_main', wraps=meld_port._DMP.diff_main) as diff_main:
+            self.assertEqual(meld_port._inline_opcodes(text1[:100], text2[:100]), (('equal', 0, 100, 0, 100),))
+            meld_port._inline_opcodes(text1[:200], text2[:200])
+            diff_main.assert_not_called()
+            opcodes = meld_port._inline_opcodes(text1, text2)
+            diff_main.assert_called_once()
+        self.assertEqual(opcodes[1], ('replace', 100, 101, 100, 101))
+        with mock.patch.object(meld_port, '_CYDIFFLIB', True), \
+                mock.patch.object(meld_port._DMP, 'diff_main') as diff_main:
+            meld_port._inline_opcodes(text1, text2)
+        diff_main.assert_not_called()
+
+    @unittest.skipIf(meld_port._DMP is None, "diff-match-patch not installed")
+    def test_myers_timeout_falls_back(self):
+        """Test a character diff that runs out of time falls back to SequenceMatcher"""
+        text1 = "ab" * meld_port.INLINE_MYERS_MIN_LENGTH
+        text2 = "ba" * meld_port.INLINE_MYERS_MIN_LENGTH
+        expected = tuple(meld_port._trimmed_opcodes(text1, text2))
+        with mock.patch.object(meld_port, '_CYDIFFLIB', False), \
+                mock.patch.object(meld_port, 'INLINE_MYERS_TIMEOUT', 1e-9):
+            self.assertEqual(meld_port._inline_opcodes(text1, text2), expected)
+
+    def test_cached(self):
+        """Test repeated line pairs are served from the cache"""
+        meld_port._cached_inline_opcodes.cache_clear()
+        first = compute_inline_diff("foo = 1", "foo = 2")
+        second = compute_inline_diff("foo = 1", "foo = 2")
+        self.assertIs(first, second)
+        self.assertEqual(meld_port._cached_inline_opcodes.cache_info().hits, 1)
+
+    def test_long_pairs_not_cached(self):
+        """Test line pairs above INLINE_CACHE_MAX_LENGTH bypass the cache"""
+        meld_port._cached_inline_opcodes.cache_clear()
+        text1 = "a" * meld_port.INLINE_CACHE_MAX_LENGTH
+        opcodes = compute_inline_diff(text1, text1 + "b")
+        self.assertEqual(opcodes[-1], ('insert', len(text1), len(text1), len(text1), len(text1) + 1))
+        self.assertEqual(meld_port._cached_inline_opcodes.cache_info().currsize, 0)
+
 
 class TestFormatLineWithInlineDiff(unittest.TestCase):
     def test_no_change(self):
@@ -96,6 +252,35 @@ class TestFormatLineWithInlineDiff(unittest.TestCase):
         result = format_line_with_inline_diff("hello", "hallo", True)
         self.assertIn('<span class="inline-diff">', result)
 
+    @unittest.skipIf(meld_port._DMP is None, "diff-match-patch not installed")
+    def test_long_line(self):
+        """Test lines beyond the difflib limit are highlighted with diff-match-patch"""
+        line = "a" * 15000 + "b" + "c" * 15000
+        other_line = "a" * 15000 + "X" + "c" * 15000
+        with mock.patch.object(meld_port, '_CYDIFFLIB', False):
+            result = format_line_with_inline_diff(line, other_line, True)
+        self.assertIn('<span class="inline-diff">b</span>', result)
+
+    def test_long_line_without_myers(self):
+        """Test lines beyond the difflib limit are not highlighted when diff-match-patch
+        would not be used, times out, or has used up its time budget"""
+        line = "a" * 15000 + "b" + "c" * 15000
+        other_line = "a" * 15000 + "X" + "c" * 15000
+        with mock.patch.object(meld_port, '_CYDIFFLIB', True):
+            self.assertEqual(format_line_with_inline_diff(line, other_line, True), line)
+        with mock.patch.object(meld_port, '_CYDIFFLIB', False), \
+                mock.patch.object(meld_port, 'INLINE_MYERS_TIMEOUT', 1e-9):
+            self.assertEqual(format_line_with_inline_diff(line + "d", other_line, True), line + "d")
+        with mock.patch.object(meld_port, '_CYDIFFLIB', False), \
+                mock.patch.object(meld_port, '_inline_myers_budget', 0):
+            self.assertEqual(format_line_with_inline_diff(line + "e", other_line, True), line + "e")
+
+    def test_over_limit(self):
+        """Test inline highlighting is skipped above INLINE_HIGHLIGHT_LIMIT"""
+        with mock.patch.object(meld_port, 'INLINE_HIGHLIGHT_LIMIT', 8):
+            result = format_line_with_inline_diff("hello", "hallo", True)
+        self.assertEqual(result, "hello")
+
     def test_empty_line(self):
         """Test formatting empty line"""
         result = format_line_with_inline_diff("", "", False)
@@ -109,6 +294,166 @@ class TestFormatLineWithInlineDiff(unittest.TestCase):
         self.assertNotIn("<script>", result)
 
 
+class TestFormatLines(unittest.TestCase):
+    def test_chunk_classes(self):
+        """Test lines get the class of the chunk they belong to"""
+        text_a = "A\nB\nC\nD"
+        text_b = "A\nX\nC\nY\nZ"
+        chunks = compute_diff(text_a, text_b)
+        left = format_lines(text_a.splitlines(), text_b.splitlines(), chunks, True).split('\n')
+        right = format_lines(text_b.splitlines(), text_a.splitlines(), chunks, False).split('\n')
+        self.assertIn('class="line "', left[0])
+        self.assertIn('class="line chunk-replace"', left[1])
+        self.assertIn('class="line "', left[2])
+        self.assertIn('class="line chunk-replace"', right[3])
+        self.assertIn('class="line chunk-replace"', right[4])
+
+    def test_replace_inline_diff(self):
+        """Test replaced lines are highlighted against their counterpart"""
+        lines_a = ["same", "hello"]
+        lines_b = ["same", "hallo"]
+        chunks = compute_diff("\n".join(lines_a), "\n".join(lines_b))
+        left = format_lines(lines_a, lines_b, chunks, True).split('\n')
+        self.assertNotIn('<span class="inline-diff">', left[0])
+        self.assertIn('<span class="inline-diff">e</span>', left[1])
+
+    def test_html_escaping(self):
+        """Test unchanged and changed lines are HTML escaped"""
+        lines = ["<a href='x'>", "a & b", ""]
+        result = format_lines(lines, lines, [], True).split('\n')
+        self.assertIn("&lt;a href=&#x27;x&#x27;&gt;", result[0])
+        self.assertIn("a &amp; b", result[1])
+        self.assertIn('<span class="line-content">&nbsp;</span>', result[2])
+
+        result = format_lines(["a\nb", "<"], ["x", "y"], [], True).split('\n')
+        self.assertIn("&lt;", result[-1])
+
+    def test_uneven_replace(self):
+        """Test replaced lines without a counterpart in the chunk are not inline diffed"""
+        lines_a = ["same", "hello", "zzz", "end"]
+        lines_b = ["same", "hallo", "end"]
+        chunks = compute_diff("\n".join(lines_a), "\n".join(lines_b))
+        self.assertEqual(chunks, [meld_port.DiffChunk('replace', 1, 3, 1, 2)])
+        left = format_lines(lines_a, lines_b, chunks, True).split('\n')
+        self.assertIn('<span class="inline-diff">', left[1])
+        self.assertIn('class="line chunk-replace"', left[2])
+        self.assertNotIn('<span class="inline-diff">', left[2])
+
+
+class TestGenerateHtml(unittest.TestCase):
+    def test_render(self):
+        """Test the page is rendered from the template"""
+        text_a = "A\nB\nC\nD"
+        text_b = "A\nX\nC\nY\nZ"
+        chunks = compute_diff(text_a, text_b)
+        template_path = Path(meld_port.__file__).parent / 'template.html'
+        page = ''.join(meld_port.generate_html(text_a, text_b, chunks, str(template_path)))
+        self.assertIn(f"Chunks: {len(chunks)}", page)
+        self.assertIn('<div class="line chunk-replace" data-line="1">', page)
+
+        chunks_json = page.split("const chunks = ", 1)[1].split(";\n", 1)[0]
+        self.assertEqual(json.loads(chunks_json), [
+            {"id": i, "tag": chunk.tag, "start_a": chunk.start_a, "end_a": chunk.end_a,
+             "start_b": chunk.start_b, "end_b": chunk.end_b}
+            for i, chunk in enumerate(chunks)
+        ])
+
+
+class TestDiffCache(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.cache_dir = Path(self.tmp.name)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_miss(self):
+        """Test uncached texts are not found"""
+        self.assertIsNone(meld_port.load_cached_diff("a", "b", self.cache_dir))
+
+    def test_round_trip(self):
+        """Test stored chunks are loaded back"""
+        text_a = "A\nB\nC\nD"
+        text_b = "A\nX\nC\nY\nZ"
+        chunks = compute_diff(text_a, text_b)
+        meld_port.store_cached_diff(text_a, text_b, chunks, self.cache_dir)
+        self.assertEqual(meld_port.load_cached_diff(text_a, text_b, self.cache_dir), chunks)
+        self.assertIsNone(meld_port.load_cached_diff(text_b, text_a, self.cache_dir))
+
+    def test_corrupt_entry(self):
+        """Test a corrupt cache entry is treated as a miss"""
+        meld_port.store_cached_diff("a", "b", [], self.cache_dir)
+        for entry in self.cache_dir.glob('*.json'):
+            entry.write_bytes(b"garbage")
+        self.assertIsNone(meld_port.load_cached_diff("a", "b", self.cache_dir))
+
+    def test_damaged_entry(self):
+        """Test a truncated or bit-flipped cache entry loads as a miss or as chunks"""
+        text_a = "A\nB\nC\nD"
+        text_b = "A\nX\nC\nY\nZ"
+        meld_port.store_cached_diff(text_a, text_b, compute_diff(text_a, text_b), self.cache_dir)
+        entry, = self.cache_dir.glob('*.json')
+        data = entry.read_bytes()
+
+        entry.write_bytes(data[:len(data) // 2])
+        self.assertIsNone(meld_port.load_cached_diff(text_a, text_b, self.cache_dir))
+
+        for i in range(len(data)):
+            for bit in range(8):
+                damaged = bytearray(data)
+                damaged[i] ^= 1 << bit
+                entry.write_bytes(damaged)
+                chunks = meld_port.load_cached_diff(text_a, text_b, self.cache_dir)
+                if chunks is not None:
+                    for chunk in chunks:
+                        self.assertIn(chunk.tag, ('replace', 'delete', 'insert'))
+
+    def test_backend_in_key(self):
+        """Test entries computed by a different diff backend are not reused"""
+        with mock.patch.object(meld_port, '_CYDIFFLIB', True):
+            meld_port.store_cached_diff("a", "b", [], self.cache_dir)
+            self.assertEqual(meld_port.load_cached_diff("a", "b", self.cache_dir), [])
+        with mock.patch.object(meld_port, '_CYDIFFLIB', False):
+            self.assertIsNone(meld_port.load_cached_diff("a", "b", self.cache_dir))
+
+    def test_no_home_directory(self):
+        """Test a missing home directory disables the cache instead of failing"""
+        with mock.patch.dict(os.environ, {'XDG_CACHE_HOME': ''}), \
+                mock.patch.object(Path, 'home', side_effect=RuntimeError):
+            self.assertIsNone(meld_port.load_cached_diff("a", "b"))
+            meld_port.store_cached_diff("a", "b", [])
+        with mock.patch.dict(os.environ, {'XDG_CACHE_HOME': ''}), \
+                mock.patch.object(Path, 'home', return_value=Path('~')):
+            self.assertIsNone(meld_port._diff_cache_dir())
+
+    def test_default_dir(self):
+        """Test XDG_CACHE_HOME is used for the default cache directory"""
+        with mock.patch.dict(os.environ, {'XDG_CACHE_HOME': self.tmp.name}):
+            meld_port.store_cached_diff("a", "b", [])
+            self.assertEqual(meld_port.load_cached_diff("a", "b"), [])
+        self.assertEqual(len(list((self.cache_dir / 'meld-port').glob('*.json'))), 1)
+
+    def test_stale_tmp_files_removed(self):
+        """Test temporary files left by interrupted writes are evicted once old"""
+        self.cache_dir.mkdir(exist_ok=True)
+        stale = self.cache_dir / 'stale.123.tmp'
+        fresh = self.cache_dir / 'fresh.456.tmp'
+        stale.write_bytes(b"")
+        fresh.write_bytes(b"")
+        old = time.time() - meld_port.DIFF_CACHE_TMP_MAX_AGE - 60
+        os.utime(stale, (old, old))
+        meld_port.store_cached_diff("a", "b", [], self.cache_dir)
+        self.assertFalse(stale.exists())
+        self.assertTrue(fresh.exists())
+
+    def test_eviction(self):
+        """Test the cache is bounded to DIFF_CACHE_MAX_ENTRIES"""
+        with mock.patch.object(meld_port, 'DIFF_CACHE_MAX_ENTRIES', 3):
+            for i in range(5):
+                meld_port.store_cached_diff("a", str(i), [], self.cache_dir)
+        self.assertEqual(len(list(self.cache_dir.glob('*.json'))), 3)
+
+
 class TestCheckFileLimits(unittest.TestCase):
     def test_normal_file(self):
         """Test file within limits"""
@@ -128,6 +473,18 @@ class TestCheckFileLimits(unittest.TestCase):
         result = check_file_limits(text, "test.txt")
         self.assertFalse(result, "Should reject files with very long lines")
 
+    def test_long_line_after_short_lines(self):
+        """Test long line detection deep into a file"""
+        text = "short\n" * 5000 + "x" * 9000 + "\nshort"
+        result = check_file_limits(text, "test.txt")
+        self.assertFalse(result, "Should reject files with very long lines")
+
+    def test_line_at_limit_with_crlf(self):
+        """Test line ending characters do not count towards the line length"""
+        text = ("x" * 8 * 1024 + "\r\n") * 3
+        result = check_file_limits(text, "test.txt")
+        self.assertTrue(result)
+
     def test_multiple_normal_lines(self):
         """Test file with many normal lines"""
         text = "\n".join(["line " + str(i) for i in range(1000)])